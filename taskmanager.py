@@ -1,4 +1,12 @@
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import operator
 import psutil
+import numpy as np
 import tkinter as tk
 from tkinter import ttk, messagebox, scrolledtext
 from datetime import datetime
@@ -7,9 +15,341 @@ from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 from matplotlib.figure import Figure
 import tkinter.font as tkFont
 import threading
+from collections import deque
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+ALERT_RULES_FILE = os.path.expanduser("~/.taskmanager_alerts.json")
+
+# Rule mặc định khi chưa có file cấu hình
+DEFAULT_ALERT_RULES = [
+    {"name": "System memory", "metric": "sys.mem", "op": ">", "threshold": 90, "clear": 85},
+    {"name": "System CPU", "metric": "sys.cpu", "op": ">", "threshold": 95, "for": 30},
+]
+
+
+class AlertRule:
+    """Một rule ngưỡng, ví dụ: RSS của name=java > 8 GB trong 60 giây"""
+    OPS = {'>': operator.gt, '>=': operator.ge, '<': operator.lt, '<=': operator.le}
+    METRICS = {
+        'proc.rss', 'proc.cpu',
+        'sys.cpu', 'sys.mem', 'sys.proc_count', 'sys.psi_cpu', 'sys.psi_mem', 'sys.psi_io'
+    }
+    UNITS = {'': 1, '%': 1, 'KB': 1024, 'MB': 1024 ** 2, 'GB': 1024 ** 3, 'TB': 1024 ** 4}
+
+    def __init__(self, name, metric, threshold, op='>', match=None, duration=0, clear=None, action=None):
+        if metric not in self.METRICS:
+            raise ValueError(f"Unknown metric '{metric}' in rule '{name}'")
+        if op not in self.OPS:
+            raise ValueError(f"Unknown operator '{op}' in rule '{name}'")
+        if action not in (None, 'detail', 'sigstop'):
+            raise ValueError(f"Unknown action '{action}' in rule '{name}'")
+        # Action tự động chỉ cho rule tiến trình có match, tránh tác động hàng loạt
+        if action and (not metric.startswith('proc.') or not match):
+            raise ValueError(f"Action '{action}' in rule '{name}' requires a proc.* metric with match")
+
+        self.name = name
+        self.scope, self.field = metric.split('.', 1)
+        self.op = op
+        self.compare = self.OPS[op]
+        self.threshold = self.parse_value(threshold)
+        self.duration = float(duration)
+        self.action = action
+
+        # Hysteresis: mặc định chỉ clear khi giá trị lùi lại 5% so với ngưỡng
+        if clear is None:
+            factor = 0.95 if op in ('>', '>=') else 1.05
+            self.clear = self.threshold * factor
+        else:
+            self.clear = self.parse_value(clear)
+            if not self.compare(self.threshold, self.clear) and self.threshold != self.clear:
+                raise ValueError(f"Clear level {clear} in rule '{name}' must be on the normal side of the threshold")
+
+        # match dạng "name=java" hoặc "user=root"
+        self.match = None
+        if match:
+            field, _, pattern = match.partition('=')
+            if field not in ('name', 'user') or not pattern:
+                raise ValueError(f"Invalid match '{match}' in rule '{name}'")
+            self.match = (field, pattern)
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            name=data['name'],
+            metric=data['metric'],
+            threshold=data['threshold'],
+            op=data.get('op', '>'),
+            match=data.get('match'),
+            duration=data.get('for', 0),
+            clear=data.get('clear'),
+            action=data.get('action')
+        )
+
+    @classmethod
+    def parse_value(cls, value):
+        """Chuyển '8 GB', '512MB', '90%' hoặc số thành float"""
+        if isinstance(value, (int, float)):
+            return float(value)
+        m = re.fullmatch(r'\s*([\d.]+)\s*([KMGT]?B|%)?\s*', str(value), re.IGNORECASE)
+        if not m:
+            raise ValueError(f"Invalid threshold '{value}'")
+        return float(m.group(1)) * cls.UNITS[(m.group(2) or '').upper()]
+
+    def format_value(self, value):
+        if self.field == 'rss':
+            return f"{value / (1024 ** 2):.0f} MB"
+        if self.field == 'proc_count':
+            return f"{value:.0f}"
+        return f"{value:.1f}%"
+
+
+class AlertEngine:
+    """Đánh giá các rule trên mỗi snapshot, có hysteresis và chống trùng lặp"""
+
+    def __init__(self, rules, log_size=500):
+        self.rules = rules
+        self.pending = [{} for _ in rules]   # key -> thời điểm bắt đầu vượt ngưỡng
+        self.active = [{} for _ in rules]    # key -> alert đang bật
+        self.log = deque(maxlen=log_size)
+
+    @classmethod
+    def from_file(cls, path=ALERT_RULES_FILE):
+        rules_data = DEFAULT_ALERT_RULES
+        if os.path.exists(path):
+            with open(path) as f:
+                rules_data = json.load(f)
+            if not isinstance(rules_data, list) or not all(isinstance(data, dict) for data in rules_data):
+                raise ValueError(f"{path} must contain a JSON list of rule objects")
+        return cls([AlertRule.from_dict(data) for data in rules_data])
+
+    def active_alerts(self):
+        return [alert for active in self.active for alert in active.values()]
+
+    def evaluate(self, snapshot, system, now=None):
+        """Trả về danh sách alert vừa bật (FIRING) hoặc vừa tắt (CLEARED)"""
+        now = time.time() if now is None else now
+        events = []
+
+        for index, rule in enumerate(self.rules):
+            if rule.scope == 'proc':
+                keys = snapshot['pid']
+                names = snapshot['name']
+                values = snapshot[rule.field]
+                if rule.match:
+                    field, pattern = rule.match
+                    mask = snapshot[field] == pattern
+                    keys, names, values = keys[mask], names[mask], values[mask]
+            else:
+                keys = np.array([0])
+                names = np.array([""])
+                values = np.array([system.get(rule.field, 0.0)], dtype=float)
+
+            # So sánh vector hóa trên toàn bộ snapshot
+            breach = rule.compare(values, rule.threshold)
+            breaching = set(keys[breach].tolist())
+            held = set(keys[rule.compare(values, rule.clear)].tolist())
+
+            pending = self.pending[index]
+            active = self.active[index]
+
+            # Timer 'for' tính theo ngưỡng; hysteresis (clear) chỉ áp dụng cho alert đang bật
+            for key in list(pending):
+                if key in active:
+                    if key not in held:
+                        del pending[key]
+                        alert = active.pop(key)
+                        events.append(self.record(rule, 'CLEARED', key, alert['name'], None, now))
+                elif key not in breaching:
+                    del pending[key]
+
+            for key, name, value in zip(keys[breach].tolist(), names[breach].tolist(), values[breach].tolist()):
+                started = pending.setdefault(key, now)
+                if key not in active and now - started >= rule.duration:
+                    active[key] = self.record(rule, 'FIRING', key, name, value, now)
+                    events.append(active[key])
+
+        return events
+
+    def record(self, rule, state, key, name, value, now):
+        target = f"{name} (PID {key})" if rule.scope == 'proc' else "system"
+        if state == 'FIRING':
+            message = (f"{rule.name}: {target} {rule.field} = {rule.format_value(value)} "
+                       f"{rule.op} {rule.format_value(rule.threshold)}")
+        else:
+            message = f"{rule.name}: {target} back to normal"
+        alert = {
+            'time': now, 'rule': rule, 'state': state,
+            'pid': key if rule.scope == 'proc' else None,
+            'name': name, 'value': value, 'message': message
+        }
+        self.log.append(alert)
+        return alert
+
+
+class PerfStats:
+    """Đo chi phí của chính task manager: thời gian từng stage, CPU/RSS, tick bị trễ"""
+
+    def __init__(self, interval_ms):
+        self.interval = interval_ms / 1000.0
+        self.stages = {}
+        self.lock = threading.Lock()
+        self.proc = psutil.Process()
+        self.proc.cpu_percent(None)
+        self.cpu_count = psutil.cpu_count() or 1
+        self.self_cpu = 0.0
+        self.self_rss = self.proc.memory_info().rss
+        self.ticks = 0
+        self.dropped_ticks = 0
+        self.rows_touched = 0
+        self.last_tick = None
+
+    def record(self, stage, seconds):
+        ms = seconds * 1000.0
+        with self.lock:
+            stat = self.stages.setdefault(stage, {'last': 0.0, 'avg': ms, 'max': 0.0, 'count': 0})
+            stat['last'] = ms
+            stat['avg'] = stat['avg'] * 0.9 + ms * 0.1
+            stat['max'] = max(stat['max'], ms)
+            stat['count'] += 1
+
+    def tick(self, now=None):
+        """Đếm các tick bị bỏ lỡ so với nhịp update_interval mong muốn"""
+        now = time.perf_counter() if now is None else now
+        if self.last_tick is not None:
+            self.dropped_ticks += max(0, int((now - self.last_tick) // self.interval) - 1)
+        self.last_tick = now
+        self.ticks += 1
+
+    def reset_tick(self):
+        self.last_tick = None
+
+    def sample_self(self):
+        self.self_cpu = self.proc.cpu_percent(None) / self.cpu_count
+        self.self_rss = self.proc.memory_info().rss
+
+    def as_dict(self):
+        with self.lock:
+            stages = {name: dict(stat) for name, stat in self.stages.items()}
+        return {
+            'time': datetime.now().isoformat(timespec='seconds'),
+            'self_cpu_percent': self.self_cpu,
+            'self_rss_bytes': self.self_rss,
+            'ticks': self.ticks,
+            'dropped_ticks': self.dropped_ticks,
+            'rows_touched': self.rows_touched,
+            'stages_ms': stages
+        }
+
+    def format(self):
+        data = self.as_dict()
+        lines = [
+            f"Self CPU: {data['self_cpu_percent']:.1f}%   RSS: {data['self_rss_bytes'] / (1024 ** 2):.0f} MB",
+            f"Ticks: {data['ticks']}   Dropped: {data['dropped_ticks']}   Rows/refresh: {data['rows_touched']}",
+            f"{'Stage':<14}{'last':>8}{'avg':>8}{'max':>8}  (ms)"
+        ]
+        for name, stat in data['stages_ms'].items():
+            lines.append(f"{name:<14}{stat['last']:>8.1f}{stat['avg']:>8.1f}{stat['max']:>8.1f}")
+        lines.append("F12: hide | Ctrl+D: dump")
+        return "\n".join(lines)
+
+    def dump(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.as_dict(), f, indent=2)
+
+
+class MetricsExporter:
+    """Phục vụ snapshot mới nhất ở định dạng Prometheus text trên localhost"""
+    CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+    def __init__(self, port, host="127.0.0.1", top_n=10):
+        self.top_n = top_n
+        self.payload = b""
+        exporter = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] not in ('/', '/metrics'):
+                    self.send_error(404)
+                    return
+                # Chỉ trả về bản render sẵn, không bao giờ đọc /proc khi bị scrape
+                body = exporter.payload
+                self.send_response(200)
+                self.send_header("Content-Type", exporter.CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def shutdown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    @staticmethod
+    def escape(value):
+        return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+    def render(self, graph_data, snapshot, active_alerts, disk_io=None, net_io=None, psi_available=True):
+        """Render một lần cho mỗi lần lấy mẫu, lưu vào cache"""
+        def latest(key):
+            return graph_data[key][-1] if graph_data[key] else 0.0
+
+        lines = []
+
+        def metric(name, help_text, samples, metric_type="gauge"):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            for labels, value in samples:
+                if labels:
+                    label_str = ",".join(f'{k}="{self.escape(v)}"' for k, v in labels.items())
+                    lines.append(f"{name}{{{label_str}}} {float(value)!r}")
+                else:
+                    lines.append(f"{name} {float(value)!r}")
+
+        percore = graph_data['percore'][-1] if graph_data['percore'] else []
+        metric("taskmanager_cpu_percent", "System-wide CPU utilisation.", [(None, latest('cpu'))])
+        metric("taskmanager_cpu_core_percent", "Per-core CPU utilisation.",
+              [({'core': i}, val) for i, val in enumerate(percore)])
+        metric("taskmanager_memory_percent", "System memory utilisation.", [(None, latest('mem'))])
+        # Counter thô, để Prometheus tự tính rate()
+        if disk_io:
+            metric("taskmanager_disk_read_bytes_total", "Bytes read from disk.",
+                  [(None, disk_io.read_bytes)], "counter")
+            metric("taskmanager_disk_written_bytes_total", "Bytes written to disk.",
+                  [(None, disk_io.write_bytes)], "counter")
+        if net_io:
+            metric("taskmanager_network_received_bytes_total", "Bytes received on all interfaces.",
+                  [(None, net_io.bytes_recv)], "counter")
+            metric("taskmanager_network_sent_bytes_total", "Bytes sent on all interfaces.",
+                  [(None, net_io.bytes_sent)], "counter")
+        if psi_available:
+            metric("taskmanager_pressure_some_avg10", "Pressure stall 'some' avg10 percentage.",
+                  [({'resource': res}, latest(key)) for res, key in
+                   [('cpu', 'psi_cpu'), ('memory', 'psi_mem'), ('io', 'psi_io')]])
+        metric("taskmanager_processes", "Number of processes.", [(None, len(snapshot['pid']))])
+        metric("taskmanager_alerts_active", "Number of active alerts.", [(None, len(active_alerts))])
+
+        # Top-N theo CPU và RSS, label theo rank + name (không dùng pid để tránh series mới liên tục)
+        n = min(self.top_n, len(snapshot['pid']))
+        for field, name, help_text in [
+            ('cpu', "taskmanager_process_cpu_percent", "CPU utilisation of the top processes by CPU."),
+            ('rss', "taskmanager_process_rss_bytes", "Resident memory of the top processes by RSS.")
+        ]:
+            top = np.argsort(snapshot[field])[::-1][:n]
+            metric(name, help_text,
+                  [({'rank': rank, 'name': snapshot['name'][i]}, snapshot[field][i])
+                   for rank, i in enumerate(top, start=1)])
+
+        self.payload = ("\n".join(lines) + "\n").encode("utf-8")
+
 
 class ModernTaskManager(tk.Tk):
-    def __init__(self):
+    def __init__(self, metrics_port=None):
         super().__init__()
         self.title("Task Manager Base")
         self.geometry("1400x900")
@@ -36,8 +376,27 @@ class ModernTaskManager(tk.Tk):
         # Data structures
         self.columns = ("PID", "Name", "User", "CPU%", "Memory", "Status")
         self.process_cache = []
-        self.graph_data = {'cpu': [], 'mem': [], 'disk': [], 'network': []}
+        self.graph_data = {'cpu': [], 'mem': [], 'disk': [], 'network': [], 'percore': [],
+                           'psi_cpu': [], 'psi_mem': [], 'psi_io': []}
+        self.history_len = 60
+        self.psi_available = os.path.isdir('/proc/pressure')
         self.update_interval = 100        
+        self.perf = PerfStats(self.update_interval)
+        self.proc_snapshot = self.build_snapshot([], [], [], [], [])
+        self.alert_rules_error = None
+        try:
+            self.alert_engine = AlertEngine.from_file()
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            self.alert_rules_error = f"Alert rules error: {e} (using defaults)"
+            print(self.alert_rules_error, file=sys.stderr)
+            self.alert_engine = AlertEngine([AlertRule.from_dict(data) for data in DEFAULT_ALERT_RULES])
+        self.detail_opened = {}   # pid -> lần cuối action 'detail' mở cửa sổ
+        self.metrics_exporter = None
+        if metrics_port:
+            try:
+                self.metrics_exporter = MetricsExporter(metrics_port)
+            except OSError as e:
+                print(f"Metrics endpoint disabled: cannot bind 127.0.0.1:{metrics_port}: {e}", file=sys.stderr)
         # UI Elements
         self.create_main_frame()
         self.create_header()
@@ -46,9 +405,15 @@ class ModernTaskManager(tk.Tk):
         self.create_graph_panel()
         self.create_status_bar()
         self.apply_theme()
+        if self.alert_rules_error:
+            self.status_var.set(self.alert_rules_error)
         
         # Initial data load
         self.update_data()
+        self.update_perf_overlay()
+        self.bind("<F12>", lambda e: self.toggle_perf_overlay())
+        self.bind("<Control-d>", self.on_dump_key)
+        self.bind("<Control-D>", self.on_dump_key)
         
         # Window close handler
         self.protocol("WM_DELETE_WINDOW", self.on_close)
@@ -119,9 +484,12 @@ class ModernTaskManager(tk.Tk):
         self.canvas.draw()
 
     def configure_all_plots(self):
-        for ax in [self.ax_cpu, self.ax_mem, self.ax_disk, self.ax_network]:
+        for ax in [self.ax_cpu, self.ax_mem, self.ax_disk, self.ax_network, self.ax_percore, self.ax_psi]:
             ax.set_facecolor(self.plot_bg_color)
-            ax.grid(True, linestyle=':', alpha=0.7)
+            if ax is self.ax_percore:
+                ax.grid(False)
+            else:
+                ax.grid(True, linestyle=':', alpha=0.7)
             ax.tick_params(labelsize=8, colors='white' if self.current_theme == "dark" else 'black')
             for spine in ax.spines.values():
                 spine.set_color('white' if self.current_theme == "dark" else 'black')
@@ -218,6 +586,12 @@ class ModernTaskManager(tk.Tk):
         ttk.Button(button_frame, 
                   text="Details", 
                   command=self.show_process_details).pack(side=tk.LEFT, padx=2)
+        ttk.Button(button_frame, 
+                  text="Alerts", 
+                  command=lambda: AlertLogWindow(self, self.alert_engine)).pack(side=tk.LEFT, padx=2)
+        ttk.Button(button_frame, 
+                  text="Stats", 
+                  command=self.toggle_perf_overlay).pack(side=tk.LEFT, padx=2)
         ttk.Button(button_frame, 
                   text="Theme", 
                   command=self.toggle_theme).pack(side=tk.LEFT, padx=2)
@@ -301,29 +675,92 @@ class ModernTaskManager(tk.Tk):
         
         # Create figure with dark theme
         plt.style.use('seaborn-v0_8')
-        self.fig = Figure(figsize=(12, 4), dpi=100, facecolor='#f5f6f7')
+        self.fig = Figure(figsize=(12, 6), dpi=100, facecolor='#f5f6f7')
         
         # Create subplots
-        self.ax_cpu = self.fig.add_subplot(141)
-        self.ax_mem = self.fig.add_subplot(142)
-        self.ax_disk = self.fig.add_subplot(143)
-        self.ax_network = self.fig.add_subplot(144)
+        self.ax_cpu = self.fig.add_subplot(241)
+        self.ax_mem = self.fig.add_subplot(242)
+        self.ax_disk = self.fig.add_subplot(243)
+        self.ax_network = self.fig.add_subplot(244)
+        self.ax_percore = self.fig.add_subplot(2, 4, (5, 6))
+        self.ax_psi = self.fig.add_subplot(2, 4, (7, 8))
         
         # Configure plots
         self.configure_plot(self.ax_cpu, "CPU Usage", "%", '#3498db')
         self.configure_plot(self.ax_mem, "Memory Usage", "%", '#2ecc71')
         self.configure_plot(self.ax_disk, "Disk Usage", "%", '#e74c3c')
         self.configure_plot(self.ax_network, "Network", "MB/s", '#9b59b6')
+        self.configure_plot(self.ax_percore, "CPU per Core", "Core", '#e67e22')
+        psi_title = "Pressure Stall (avg10)" if self.psi_available else "Pressure Stall (N/A)"
+        self.configure_plot(self.ax_psi, psi_title, "%", '#16a085')
         
-        # Create lines
-        self.cpu_line, = self.ax_cpu.plot([], [], lw=2)
-        self.mem_line, = self.ax_mem.plot([], [], lw=2)
-        self.disk_line, = self.ax_disk.plot([], [], lw=2)
-        self.network_line, = self.ax_network.plot([], [], lw=2)
+        # Create lines (animated: không vẽ trong full draw, chỉ blit mỗi tick)
+        self.cpu_line, = self.ax_cpu.plot([], [], lw=2, color='#3498db', animated=True)
+        self.mem_line, = self.ax_mem.plot([], [], lw=2, color='#2ecc71', animated=True)
+        self.disk_line, = self.ax_disk.plot([], [], lw=2, color='#e74c3c', animated=True)
+        self.network_line, = self.ax_network.plot([], [], lw=2, color='#9b59b6', animated=True)
+        self.psi_cpu_line, = self.ax_psi.plot([], [], lw=2, color='#3498db', label='cpu', animated=True)
+        self.psi_mem_line, = self.ax_psi.plot([], [], lw=2, color='#2ecc71', label='memory', animated=True)
+        self.psi_io_line, = self.ax_psi.plot([], [], lw=2, color='#e74c3c', label='io', animated=True)
+        self.ax_psi.legend(loc='upper left', fontsize=7)
+
+        # Thang cố định để nền (trục, nhãn) không đổi giữa các tick
+        for ax in [self.ax_cpu, self.ax_mem, self.ax_disk, self.ax_network, self.ax_psi]:
+            ax.set_xlim(0, self.history_len - 1)
+        self.ax_cpu.set_ylim(0, 100)
+        self.ax_mem.set_ylim(0, 100)
+        self.ax_disk.set_ylim(0, 1)
+        self.ax_network.set_ylim(0, 1)
+        self.ax_psi.set_ylim(0, 10)
+
+        # Per-core heatmap: một image duy nhất (cores x thời gian), chỉ set_data mỗi lần cập nhật
+        self.percore_image = self.ax_percore.imshow(
+            np.zeros((self.cpu_count, self.history_len)),
+            aspect='auto', origin='lower', interpolation='nearest',
+            cmap='inferno', vmin=0, vmax=100, animated=True
+        )
+        self.fig.tight_layout()
+
+        self.graph_artists = [
+            self.percore_image, self.cpu_line, self.mem_line, self.disk_line, self.network_line,
+            self.psi_cpu_line, self.psi_mem_line, self.psi_io_line
+        ]
         
         # Create canvas
         self.canvas = FigureCanvasTkAgg(self.fig, master=graph_frame)
         self.canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
+        self.graph_background = None
+        self.canvas.mpl_connect('draw_event', self.on_graph_draw)
+
+        # Overlay đo chi phí của chính ứng dụng (ẩn mặc định)
+        self.perf_visible = False
+        self.perf_var = tk.StringVar()
+        self.perf_label = tk.Label(graph_frame,
+                                   textvariable=self.perf_var,
+                                   font=('DejaVu Sans Mono', 9),
+                                   justify=tk.LEFT,
+                                   bg='#2c3e50',
+                                   fg='white',
+                                   padx=8,
+                                   pady=6)
+
+    def on_graph_draw(self, event):
+        """Sau mỗi full draw (khởi tạo, resize, đổi theme, đổi thang): lưu nền để blit"""
+        self.graph_background = self.canvas.copy_from_bbox(self.fig.bbox)
+        self.draw_graph_artists()
+
+    def draw_graph_artists(self):
+        for artist in self.graph_artists:
+            artist.axes.draw_artist(artist)
+
+    def rescale_axis(self, ax, data, floor):
+        """Nới thang y khi dữ liệu vượt khung hoặc giảm nhiều; trả về True nếu đã đổi"""
+        peak = max(data) if data else 0.0
+        top = ax.get_ylim()[1]
+        if peak > top or (top > floor and peak < top / 4):
+            ax.set_ylim(0, max(floor, peak * 1.5))
+            return True
+        return False
 
     def configure_plot(self, ax, title, ylabel, color):
         """Configure individual plot appearance"""
@@ -356,6 +793,11 @@ class ModernTaskManager(tk.Tk):
                  textvariable=self.clock_var,
                  style='Title.TLabel').pack(side=tk.RIGHT, padx=10)
         
+        self.alert_var = tk.StringVar()
+        ttk.Label(status_frame, 
+                 textvariable=self.alert_var,
+                 style='Title.TLabel').pack(side=tk.RIGHT, padx=10)
+        
         self.update_clock()
 
     def update_clock(self):
@@ -366,10 +808,22 @@ class ModernTaskManager(tk.Tk):
 
     def update_data(self):
         def worker():
-            if not self.pause_refresh:
+            if self.pause_refresh:
+                self.perf.reset_tick()
+            else:
+                self.perf.tick()
                 try:
                     self.update_processes()
                     self.update_graphs()
+                    self.check_alerts()
+                    if self.metrics_exporter:
+                        t0 = time.perf_counter()
+                        self.metrics_exporter.render(self.graph_data, self.proc_snapshot,
+                                                     self.alert_engine.active_alerts(),
+                                                     disk_io=getattr(self, 'last_disk_io', None),
+                                                     net_io=getattr(self, 'last_network', None),
+                                                     psi_available=self.psi_available)
+                        self.perf.record('metrics', time.perf_counter() - t0)
                 except Exception as e:
                     self.status_var.set(f"Error: {str(e)}")
             self.after(self.update_interval, self.update_data)
@@ -377,6 +831,36 @@ class ModernTaskManager(tk.Tk):
         threading.Thread(target=worker, daemon=True).start()
 
 
+    def toggle_perf_overlay(self):
+        self.perf_visible = not self.perf_visible
+        if self.perf_visible:
+            self.perf_var.set(self.perf.format())
+            self.perf_label.place(relx=1.0, rely=0.0, anchor='ne', x=-10, y=10)
+        else:
+            self.perf_label.place_forget()
+
+    def update_perf_overlay(self):
+        """Lấy mẫu CPU/RSS của chính ứng dụng mỗi giây và cập nhật overlay"""
+        self.perf.sample_self()
+        if self.perf_visible:
+            self.perf_var.set(self.perf.format())
+        self.after(1000, self.update_perf_overlay)
+
+    def on_dump_key(self, event):
+        """Ctrl+D: bỏ qua khi đang gõ trong ô Search (Ctrl+D xóa ký tự ở đó)"""
+        if isinstance(event.widget, (tk.Entry, ttk.Entry)):
+            return
+        self.dump_perf_stats()
+
+    def dump_perf_stats(self):
+        path = os.path.expanduser(f"~/taskmanager-stats-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+        try:
+            self.perf.dump(path)
+        except OSError as e:
+            self.status_var.set(f"Error dumping stats: {e}")
+        else:
+            self.status_var.set(f"Stats dumped to {path}")
+
     def refresh_process_data_async(self):
         """Chạy refresh từ background thread và cập nhật trạng thái"""
         self.status_var.set("Refreshing...")
@@ -401,9 +885,20 @@ class ModernTaskManager(tk.Tk):
 
         cpu_count = psutil.cpu_count(logical=True)
 
+        # Snapshot toàn bộ tiến trình (không lọc) cho alert engine
+        t0 = time.perf_counter()
+        snap_pids, snap_names, snap_users, snap_rss, snap_cpu = [], [], [], [], []
+
         for proc in psutil.process_iter(['pid', 'name', 'username', 'cpu_percent', 'memory_info', 'status']):
             try:
                 info = proc.info
+                if info['pid'] != 0:
+                    snap_pids.append(info['pid'])
+                    snap_names.append(info['name'] or "")
+                    snap_users.append(info['username'] or "")
+                    snap_rss.append(info['memory_info'].rss if info['memory_info'] else 0)
+                    snap_cpu.append(min((info['cpu_percent'] or 0.0) / cpu_count, 100.0))
+
                 if info['pid'] == 0 or not self.should_show(info):
                     continue
 
@@ -434,11 +929,14 @@ class ModernTaskManager(tk.Tk):
             except psutil.NoSuchProcess:
                 continue
 
+        self.proc_snapshot = self.build_snapshot(snap_pids, snap_names, snap_users, snap_rss, snap_cpu)
+        self.perf.record('collect', time.perf_counter() - t0)
 
         # Sắp xếp theo yêu cầu
         def mem_to_int(mem_str):
             return int(mem_str.split()[0]) if mem_str else 0
 
+        t0 = time.perf_counter()
         sort_mode = self.sort_var.get()
 
         if sort_mode == "Name A-Z":
@@ -461,12 +959,16 @@ class ModernTaskManager(tk.Tk):
             self.process_background.sort(key=lambda x: x['cpu%'], reverse=True)
 
 
+        self.perf.record('sort', time.perf_counter() - t0)
+
         # Cập nhật Treeview
+        t0 = time.perf_counter()
         if self.sort_changed:
             self.refresh_treeview(full_refresh=True)
             self.sort_changed = False
         else:
             self.refresh_treeview(full_refresh=False)
+        self.perf.record('treeview', time.perf_counter() - t0)
 
         total = len(self.process_apps) + len(self.process_background)
         status = (
@@ -484,6 +986,71 @@ class ModernTaskManager(tk.Tk):
 
 
 
+    def build_snapshot(self, pids, names, users, rss, cpu):
+        """Gom snapshot thành các mảng numpy để đánh giá rule vector hóa"""
+        return {
+            'pid': np.array(pids, dtype=np.int64),
+            'name': np.array(names, dtype=str),
+            'user': np.array(users, dtype=str),
+            'rss': np.array(rss, dtype=float),
+            'cpu': np.array(cpu, dtype=float)
+        }
+
+    def check_alerts(self):
+        """Đánh giá alert rule trên snapshot mới nhất"""
+        def latest(key):
+            return self.graph_data[key][-1] if self.graph_data[key] else 0.0
+
+        system = {
+            'cpu': latest('cpu'),
+            'mem': latest('mem'),
+            'proc_count': len(self.proc_snapshot['pid']),
+            'psi_cpu': latest('psi_cpu'),
+            'psi_mem': latest('psi_mem'),
+            'psi_io': latest('psi_io')
+        }
+        t0 = time.perf_counter()
+        events = self.alert_engine.evaluate(self.proc_snapshot, system)
+        self.perf.record('alerts', time.perf_counter() - t0)
+
+        for alert in events:
+            if alert['state'] == 'FIRING' and alert['rule'].action:
+                self.after(0, self.run_alert_action, alert)
+
+        active = self.alert_engine.active_alerts()
+        if active:
+            latest_alert = max(active, key=lambda alert: alert['time'])
+            self.alert_var.set(f"🔔 {len(active)} alert(s) | {latest_alert['message']}")
+        elif self.alert_rules_error:
+            # status_var bị ghi đè mỗi tick, nên lỗi file rule được giữ ở đây
+            self.alert_var.set(f"⚠️ {self.alert_rules_error}")
+        else:
+            self.alert_var.set("")
+
+    def run_alert_action(self, alert):
+        """Thực thi action của rule: mở chi tiết tiến trình hoặc gửi SIGSTOP"""
+        pid = alert['pid']
+        action = alert['rule'].action
+        # Không bao giờ tác động lên chính task manager
+        if pid == os.getpid():
+            return
+        if action == 'detail':
+            # Giới hạn mỗi PID một cửa sổ trong 60 giây
+            now = time.time()
+            self.detail_opened = {p: t for p, t in self.detail_opened.items() if now - t < 60}
+            if pid in self.detail_opened:
+                return
+            self.detail_opened[pid] = now
+            ProcessDetailWindow(self, pid)
+        elif action == 'sigstop':
+            try:
+                psutil.Process(pid).suspend()
+                self.status_var.set(f"Đã tạm dừng (SIGSTOP) tiến trình {alert['name']} (PID {pid})")
+            except psutil.NoSuchProcess:
+                self.status_var.set(f"Tiến trình PID {pid} đã không còn tồn tại")
+            except psutil.AccessDenied:
+                self.status_var.set(f"Không có quyền gửi SIGSTOP tới PID {pid}")
+
     def should_show(self, proc_info):
         """Filter processes based on current settings"""
         filter_mode = self.filter_var.get()
@@ -503,16 +1070,19 @@ class ModernTaskManager(tk.Tk):
 
     def refresh_treeview(self, full_refresh=False):
         if full_refresh:
-            self.full_refresh_treeview(self.tree_apps, self.process_apps)
-            self.full_refresh_treeview(self.tree_bg, self.process_background)
+            rows = self.full_refresh_treeview(self.tree_apps, self.process_apps)
+            rows += self.full_refresh_treeview(self.tree_bg, self.process_background)
         else:
-            self.smart_refresh_treeview(self.tree_apps, self.process_apps, self.app_rows_cache)
-            self.smart_refresh_treeview(self.tree_bg, self.process_background, self.bg_rows_cache)
+            rows = self.smart_refresh_treeview(self.tree_apps, self.process_apps, self.app_rows_cache)
+            rows += self.smart_refresh_treeview(self.tree_bg, self.process_background, self.bg_rows_cache)
+        self.perf.rows_touched = rows
 
 
     def full_refresh_treeview(self, tree, data_list):
+        """Trả về số dòng đã xóa + thêm"""
         yview = tree.yview()
-        tree.delete(*tree.get_children())
+        children = tree.get_children()
+        tree.delete(*children)
         for proc in data_list:
             row_values = (
                 proc['pid'], proc['name'], proc['user'],
@@ -520,12 +1090,15 @@ class ModernTaskManager(tk.Tk):
             )
             tree.insert("", "end", values=row_values)
         tree.yview_moveto(yview[0])
+        return len(children) + len(data_list)
 
     def smart_refresh_treeview(self, tree, data_list, cache_dict):
+        """Trả về số dòng đã xóa + thêm"""
         yview = tree.yview()  # Giữ lại vị trí cuộn
 
         # Xóa toàn bộ nội dung cũ
-        tree.delete(*tree.get_children())
+        children = tree.get_children()
+        tree.delete(*children)
         cache_dict.clear()
 
         # Thêm lại theo đúng thứ tự đã sắp xếp
@@ -538,14 +1111,18 @@ class ModernTaskManager(tk.Tk):
             cache_dict[proc['pid']] = row_values
 
         tree.yview_moveto(yview[0])
+        return len(children) + len(data_list)
 
 
 
     def update_graphs(self):
             """Cập nhật biểu đồ giống Task Manager"""
             try:
-                # CPU: % sử dụng toàn bộ
-                cpu = psutil.cpu_percent()
+                t0 = time.perf_counter()
+
+                # CPU: % từng core, tổng = trung bình các core (chỉ đọc /proc/stat một lần)
+                percore = psutil.cpu_percent(percpu=True)
+                cpu = sum(percore) / len(percore) if percore else 0.0
 
                 # RAM: % sử dụng
                 mem = psutil.virtual_memory().percent
@@ -568,31 +1145,79 @@ class ModernTaskManager(tk.Tk):
                     net_speed = 0
                 self.last_network = current_net
 
+                # Pressure stall: % thời gian bị nghẽn (some avg10)
+                psi_cpu = self.read_pressure('cpu')
+                psi_mem = self.read_pressure('memory')
+                psi_io = self.read_pressure('io')
+
                 # Cập nhật dữ liệu
-                for key, val in zip(['cpu', 'mem', 'disk', 'network'], [cpu, mem, disk_rate, net_speed]):
+                for key, val in zip(['cpu', 'mem', 'disk', 'network', 'percore', 'psi_cpu', 'psi_mem', 'psi_io'],
+                                    [cpu, mem, disk_rate, net_speed, percore, psi_cpu, psi_mem, psi_io]):
                     self.graph_data[key].append(val)
-                    if len(self.graph_data[key]) > 60:
-                        self.graph_data[key] = self.graph_data[key][-60:]
+                    if len(self.graph_data[key]) > self.history_len:
+                        self.graph_data[key] = self.graph_data[key][-self.history_len:]
+
+                self.perf.record('graph_sample', time.perf_counter() - t0)
 
                 # Vẽ biểu đồ
-                for ax, line, data, color in [
-                    (self.ax_cpu, self.cpu_line, self.graph_data['cpu'], '#3498db'),
-                    (self.ax_mem, self.mem_line, self.graph_data['mem'], '#2ecc71'),
-                    (self.ax_disk, self.disk_line, self.graph_data['disk'], '#e74c3c'),
-                    (self.ax_network, self.network_line, self.graph_data['network'], '#9b59b6')
+                t0 = time.perf_counter()
+                for line, key in [
+                    (self.cpu_line, 'cpu'),
+                    (self.mem_line, 'mem'),
+                    (self.disk_line, 'disk'),
+                    (self.network_line, 'network')
                 ]:
+                    data = self.graph_data[key]
                     line.set_data(range(len(data)), data)
-                    line.set_color(color)
-                    ax.relim()
-                    ax.autoscale_view()
-
-                self.canvas.draw()
+                rescaled = self.rescale_axis(self.ax_disk, self.graph_data['disk'], 1.0)
+                rescaled |= self.rescale_axis(self.ax_network, self.graph_data['network'], 1.0)
+
+                # Heatmap: căn phải lịch sử vào mảng cố định, cột trống = 0
+                history = self.graph_data['percore']
+                heatmap = np.zeros((self.cpu_count, self.history_len))
+                if history:
+                    samples = np.array(history, dtype=float).T[:self.cpu_count]
+                    heatmap[:samples.shape[0], -samples.shape[1]:] = samples
+                self.percore_image.set_data(heatmap)
+
+                if self.psi_available:
+                    for line, key in [
+                        (self.psi_cpu_line, 'psi_cpu'),
+                        (self.psi_mem_line, 'psi_mem'),
+                        (self.psi_io_line, 'psi_io')
+                    ]:
+                        data = self.graph_data[key]
+                        line.set_data(range(len(data)), data)
+                    psi_all = self.graph_data['psi_cpu'] + self.graph_data['psi_mem'] + self.graph_data['psi_io']
+                    rescaled |= self.rescale_axis(self.ax_psi, psi_all, 10.0)
+
+                # Chỉ full draw khi thang đo đổi; còn lại khôi phục nền và blit các artist động
+                if rescaled or self.graph_background is None:
+                    self.canvas.draw()
+                else:
+                    self.canvas.restore_region(self.graph_background)
+                    self.draw_graph_artists()
+                    self.canvas.blit(self.fig.bbox)
+                self.perf.record('graph_draw', time.perf_counter() - t0)
 
             except Exception as e:
                 print(f"Graph error: {e}")
 
 
 
+    def read_pressure(self, resource):
+        """Đọc /proc/pressure/<resource>, trả về giá trị 'some avg10' (%)"""
+        if not self.psi_available:
+            return 0.0
+        try:
+            with open(f'/proc/pressure/{resource}') as f:
+                for line in f:
+                    if line.startswith('some'):
+                        return float(line.split()[1].split('=')[1])
+        except (OSError, IndexError, ValueError):
+            pass
+        return 0.0
+
     def kill_process(self):
         """Kill selected process từ tab hiện tại"""
         current_tab = self.notebook.index(self.notebook.select())
@@ -656,6 +1281,8 @@ class ModernTaskManager(tk.Tk):
 
     def on_close(self):
         """Handle window close event"""
+        if self.metrics_exporter:
+            self.metrics_exporter.shutdown()
         plt.close('all')
         self.destroy()
 
@@ -743,6 +1370,36 @@ class ProcessDetailWindow(tk.Toplevel):
             
         tree.pack(fill=tk.BOTH, expand=True)
 
+class AlertLogWindow(tk.Toplevel):
+    def __init__(self, master, engine):
+        super().__init__(master)
+        self.title("Alerts")
+        self.geometry("800x400")
+        self.engine = engine
+        
+        self.text = scrolledtext.ScrolledText(self, wrap=tk.WORD)
+        self.text.pack(fill=tk.BOTH, expand=True)
+        self.refresh()
+
+    def refresh(self):
+        """Nạp lại alert log mỗi giây"""
+        if not self.winfo_exists():
+            return
+        self.text.config(state=tk.NORMAL)
+        self.text.delete("1.0", tk.END)
+        # Copy trước: check_alerts ghi vào deque từ worker thread
+        entries = list(self.engine.log)
+        for alert in reversed(entries):
+            stamp = datetime.fromtimestamp(alert['time']).strftime("%H:%M:%S")
+            self.text.insert(tk.END, f"[{stamp}] {alert['state']:<8} {alert['message']}\n")
+        self.text.config(state=tk.DISABLED)
+        self.after(1000, self.refresh)
+
 if __name__ == "__main__":
-    app = ModernTaskManager()
+    parser = argparse.ArgumentParser(description="Task Manager")
+    parser.add_argument("--metrics-port", type=int, default=None,
+                        help="serve Prometheus metrics on 127.0.0.1:<port>/metrics")
+    args = parser.parse_args()
+
+    app = ModernTaskManager(metrics_port=args.metrics_port)
     app.mainloop()
@@ -0,0 +1,124 @@
+import json
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from taskmanager import AlertEngine, AlertRule
+
+GB = 1024 ** 3
+
+
+def make_snapshot(rss, names=None):
+    names = names or ['java'] * len(rss)
+    return {
+        'pid': np.arange(1, len(rss) + 1, dtype=np.int64),
+        'name': np.array(names, dtype=str),
+        'user': np.array(['app'] * len(rss), dtype=str),
+        'rss': np.array(rss, dtype=float),
+        'cpu': np.zeros(len(rss))
+    }
+
+
+def java_rss_rule(**kwargs):
+    data = {"name": "Java RSS", "metric": "proc.rss", "match": "name=java", "threshold": "8 GB", "for": 60}
+    data.update(kwargs)
+    return AlertRule.from_dict(data)
+
+
+def states(events):
+    return [(alert['state'], alert['pid']) for alert in events]
+
+
+def test_parse_value_units():
+    assert AlertRule.parse_value("8 GB") == 8 * GB
+    assert AlertRule.parse_value("512mb") == 512 * 1024 ** 2
+    assert AlertRule.parse_value("90%") == 90.0
+    assert AlertRule.parse_value(3) == 3.0
+    with pytest.raises(ValueError):
+        AlertRule.parse_value("lots")
+
+
+def test_default_clear_is_five_percent_below_threshold():
+    rule = AlertRule("mem", "sys.mem", 90)
+    assert rule.clear == pytest.approx(85.5)
+    rule = AlertRule("low", "sys.mem", 10, op='<')
+    assert rule.clear == pytest.approx(10.5)
+
+
+@pytest.mark.parametrize("kwargs", [
+    {"metric": "proc.bogus"},
+    {"op": "=="},
+    {"match": "pid=1"},
+    {"action": "reboot"},
+    {"clear": "9 GB"},
+])
+def test_invalid_rules_are_rejected(kwargs):
+    with pytest.raises(ValueError):
+        java_rss_rule(**kwargs)
+
+
+def test_action_requires_process_match():
+    assert java_rss_rule(action="sigstop").action == "sigstop"
+    with pytest.raises(ValueError):
+        AlertRule("cpu", "proc.cpu", 20, action="sigstop")
+    with pytest.raises(ValueError):
+        AlertRule("mem", "sys.mem", 90, action="detail", match="name=java")
+
+
+def test_fires_only_after_sustained_breach():
+    engine = AlertEngine([java_rss_rule()])
+    assert engine.evaluate(make_snapshot([9 * GB]), {}, now=0) == []
+    assert engine.evaluate(make_snapshot([9 * GB]), {}, now=30) == []
+    assert states(engine.evaluate(make_snapshot([9 * GB]), {}, now=60)) == [('FIRING', 1)]
+
+
+def test_dip_below_threshold_resets_timer():
+    engine = AlertEngine([java_rss_rule()])
+    engine.evaluate(make_snapshot([9 * GB]), {}, now=0)
+    # 7.8 GB nằm trong dải hysteresis nhưng dưới ngưỡng: timer phải reset
+    assert engine.evaluate(make_snapshot([7.8 * GB]), {}, now=30) == []
+    assert engine.evaluate(make_snapshot([9 * GB]), {}, now=61) == []
+    assert engine.evaluate(make_snapshot([9 * GB]), {}, now=91) == []
+    assert states(engine.evaluate(make_snapshot([9 * GB]), {}, now=121)) == [('FIRING', 1)]
+
+
+def test_hysteresis_and_deduplication():
+    engine = AlertEngine([java_rss_rule(**{"for": 0})])
+    assert states(engine.evaluate(make_snapshot([9 * GB]), {}, now=0)) == [('FIRING', 1)]
+    # Vẫn vượt ngưỡng: không bắn lại
+    assert engine.evaluate(make_snapshot([9 * GB]), {}, now=1) == []
+    # Trong dải hysteresis: vẫn active
+    assert engine.evaluate(make_snapshot([7.8 * GB]), {}, now=2) == []
+    assert len(engine.active_alerts()) == 1
+    assert states(engine.evaluate(make_snapshot([7 * GB]), {}, now=3)) == [('CLEARED', 1)]
+    assert engine.active_alerts() == []
+
+
+def test_match_filters_processes_and_vanished_process_clears():
+    engine = AlertEngine([java_rss_rule(**{"for": 0})])
+    snapshot = make_snapshot([9 * GB, 9 * GB], names=['java', 'bash'])
+    assert states(engine.evaluate(snapshot, {}, now=0)) == [('FIRING', 1)]
+    assert states(engine.evaluate(make_snapshot([]), {}, now=1)) == [('CLEARED', 1)]
+
+
+def test_system_rule():
+    engine = AlertEngine([AlertRule("count", "sys.proc_count", 3)])
+    assert states(engine.evaluate(make_snapshot([]), {'proc_count': 4}, now=0)) == [('FIRING', None)]
+    assert states(engine.evaluate(make_snapshot([]), {'proc_count': 2}, now=1)) == [('CLEARED', None)]
+    assert [alert['state'] for alert in engine.log] == ['FIRING', 'CLEARED']
+
+
+def test_from_file_rejects_non_list(tmp_path):
+    path = tmp_path / "alerts.json"
+    path.write_text(json.dumps({"name": "mem", "metric": "sys.mem", "threshold": 90}))
+    with pytest.raises(ValueError):
+        AlertEngine.from_file(str(path))
+
+
+def test_from_file_defaults_when_missing(tmp_path):
+    engine = AlertEngine.from_file(str(tmp_path / "missing.json"))
+    assert [rule.name for rule in engine.rules] == ["System memory", "System CPU"]
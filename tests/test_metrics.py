@@ -0,0 +1,102 @@
+import os
+import re
+import sys
+from collections import namedtuple
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from taskmanager import MetricsExporter
+
+DiskIO = namedtuple('DiskIO', 'read_bytes write_bytes')
+NetIO = namedtuple('NetIO', 'bytes_recv bytes_sent')
+
+GRAPH_DATA = {
+    'cpu': [12.5], 'mem': [40.0], 'disk': [3.0], 'network': [0.5], 'percore': [[10.0, 15.0]],
+    'psi_cpu': [0.2], 'psi_mem': [0.0], 'psi_io': [1.5]
+}
+
+
+def make_snapshot(names, rss, cpu):
+    return {
+        'pid': np.arange(100, 100 + len(names), dtype=np.int64),
+        'name': np.array(names, dtype=str),
+        'user': np.array(['app'] * len(names), dtype=str),
+        'rss': np.array(rss, dtype=float),
+        'cpu': np.array(cpu, dtype=float)
+    }
+
+
+@pytest.fixture
+def exporter():
+    # Port 0: hệ điều hành chọn port trống
+    exporter = MetricsExporter(0, top_n=2)
+    yield exporter
+    exporter.shutdown()
+
+
+def render(exporter, snapshot, **kwargs):
+    kwargs.setdefault('disk_io', DiskIO(1000, 2000))
+    kwargs.setdefault('net_io', NetIO(3000, 4000))
+    exporter.render(GRAPH_DATA, snapshot, [], **kwargs)
+    return exporter.payload.decode('utf-8')
+
+
+def samples(text, name):
+    return [line for line in text.splitlines() if re.match(rf"{name}[{{ ]", line)]
+
+
+def test_io_counters_are_exported_as_totals(exporter):
+    text = render(exporter, make_snapshot(['a'], [1.0], [1.0]))
+    for name, value in [
+        ('taskmanager_disk_read_bytes_total', 1000),
+        ('taskmanager_disk_written_bytes_total', 2000),
+        ('taskmanager_network_received_bytes_total', 3000),
+        ('taskmanager_network_sent_bytes_total', 4000)
+    ]:
+        assert f"# TYPE {name} counter" in text
+        assert samples(text, name) == [f"{name} {float(value)!r}"]
+    assert "mbps" not in text
+
+
+def test_top_processes_labelled_by_rank_and_name(exporter):
+    snapshot = make_snapshot(['java', 'bash', 'sshd', 'nginx'], [9e9, 1e6, 2e6, 5e8], [1.0, 50.0, 2.0, 20.0])
+    text = render(exporter, snapshot)
+    assert 'pid=' not in text
+    assert samples(text, 'taskmanager_process_cpu_percent') == [
+        'taskmanager_process_cpu_percent{rank="1",name="bash"} 50.0',
+        'taskmanager_process_cpu_percent{rank="2",name="nginx"} 20.0'
+    ]
+    assert samples(text, 'taskmanager_process_rss_bytes') == [
+        'taskmanager_process_rss_bytes{rank="1",name="java"} 9000000000.0',
+        'taskmanager_process_rss_bytes{rank="2",name="nginx"} 500000000.0'
+    ]
+
+
+def test_series_per_family_bounded_by_top_n(exporter):
+    snapshot = make_snapshot([f"p{i}" for i in range(50)], np.arange(50) * 1e6, np.arange(50) / 2)
+    text = render(exporter, snapshot)
+    assert len(samples(text, 'taskmanager_process_cpu_percent')) == exporter.top_n
+    assert len(samples(text, 'taskmanager_process_rss_bytes')) == exporter.top_n
+
+
+def test_label_values_are_escaped(exporter):
+    text = render(exporter, make_snapshot(['a"b', 'c\\d'], [2.0, 1.0], [2.0, 1.0]))
+    assert 'name="a\\"b"' in text
+    assert 'name="c\\\\d"' in text
+
+
+def test_pressure_omitted_without_psi(exporter):
+    snapshot = make_snapshot(['a'], [1.0], [1.0])
+    assert 'taskmanager_pressure_some_avg10{resource="io"} 1.5' in render(exporter, snapshot)
+    assert 'taskmanager_pressure_some_avg10' not in render(exporter, snapshot, psi_available=False)
+
+
+def test_empty_snapshot(exporter):
+    text = render(exporter, make_snapshot([], [], []), disk_io=None, net_io=None)
+    assert samples(text, 'taskmanager_processes') == ['taskmanager_processes 0.0']
+    assert samples(text, 'taskmanager_process_cpu_percent') == []
+    assert 'bytes_total' not in text
+    assert text.endswith("\n")